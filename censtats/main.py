@@ -30,6 +30,9 @@ def main() -> int:
             max_alr_len_thr=args.max_alr_len_thr,
             restrict_13_21=args.restrict_13_21,
             restrict_14_22=args.restrict_14_22,
+            restrict_by_chr=args.restrict_by_chr,
+            min_jaccard_index=args.min_jaccard_index,
+            processes=args.processes,
         )
     elif args.cmd == "length":
         return calculate_hor_length(
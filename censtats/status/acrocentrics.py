@@ -21,8 +21,8 @@ def determine_acro_arms(df: pl.DataFrame, *, required_num_rtypes: int = 5) -> Ac
     ### Returns
     `Orientation` and a `pl.DataFrame` of repeats from the largest ALR.
     """
-    start_bp_pos = df.row(0, named=True)["end"]
-    end_bp_pos = df.row(-1, named=True)["end"]
+    start_bp_pos = df["end"][0]
+    end_bp_pos = df["end"][-1]
     largest_alr_repeat = df.filter(
         (pl.col("dst") == pl.col("dst").max().over(pl.col("type")))
         & (pl.col("type") == "ALR/Alpha")
@@ -34,13 +34,13 @@ def determine_acro_arms(df: pl.DataFrame, *, required_num_rtypes: int = 5) -> Ac
     abs_dst_to_end = abs(end_bp_pos - largest_alr_repeat_mdpt_pos)
     df_leftarm = df.filter(pl.col("end") < largest_alr_repeat["start"][0])
     df_rightarm = df.filter(pl.col("start") > largest_alr_repeat["end"][0])
-    l_rtypes = df_leftarm["type"].unique()
-    r_rtypes = df_rightarm["type"].unique()
+    l_num_rtypes = df_leftarm["type"].n_unique()
+    r_num_rtypes = df_rightarm["type"].n_unique()
 
     # Assumption: If less than required_num_rtypes different repeat types, then it is a partial centromere with a break at the checked arm.
-    if len(l_rtypes) < required_num_rtypes:
+    if l_num_rtypes < required_num_rtypes:
         return AcroArms(p_arm=df_leftarm, q_arm=df_rightarm)
-    elif len(r_rtypes) < required_num_rtypes:
+    elif r_num_rtypes < required_num_rtypes:
         return AcroArms(p_arm=df_rightarm, q_arm=df_leftarm)
 
     # Check for the orientation of the p-arm.
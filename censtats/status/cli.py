@@ -1,13 +1,25 @@
-import re
 import sys
 import argparse
+import multiprocessing
+from collections import defaultdict
+import numpy as np
 import polars as pl
-import editdistance
+from concurrent.futures import ProcessPoolExecutor
 from loguru import logger
-from typing import TextIO, TYPE_CHECKING, Any
+from typing import Iterable, NamedTuple, TextIO, TYPE_CHECKING, Any
+from rapidfuzz.distance import Levenshtein
+from rapidfuzz.process import cdist
 
-from .repeat_jaccard_index import jaccard_index, get_contig_similarity_by_jaccard_index
-from .repeat_edit_dst import get_contig_similarity_by_edit_dst
+from .repeat_jaccard_index import (
+    jaccard_index,
+    repeat_type_bitmask,
+    get_contig_similarity_by_jaccard_index,
+)
+from .repeat_edit_dst import (
+    build_repeat_type_encoding,
+    encode_repeat_types,
+    get_contig_similarity_by_edit_dst,
+)
 from .acrocentrics import get_q_arm_acro_chr
 from .constants import (
     ACROCENTRIC_CHROMOSOMES,
@@ -20,7 +32,7 @@ from .constants import (
     DST_PERC_THR,
 )
 from .orientation import Orientation
-from .reference import split_ref_rm_input_by_contig
+from .reference import RefCenContigs, split_ref_rm_input_by_contig
 from .reader import read_repeatmasker_output
 from .partial_cen import is_partial_centromere
 
@@ -32,58 +44,207 @@ else:
 
 
 def join_summarize_results(
-    df_partial_contig_res: pl.DataFrame,
-    df_jaccard_index_res: pl.DataFrame,
-    df_edit_distance_res: pl.DataFrame,
-    df_edit_distance_same_chr_res: pl.DataFrame,
+    df_partial_contig_res: pl.LazyFrame,
+    df_jaccard_index_res: pl.LazyFrame,
+    df_edit_distance_res: pl.LazyFrame,
+    df_edit_distance_same_chr_res: pl.LazyFrame,
     *,
     reference_prefix: str,
-) -> pl.DataFrame:
-    df_joined = (
+) -> pl.LazyFrame:
+    # Extract chromosome name.
+    # Both results must concur.
+    final_chr = (
+        pl.when(pl.col("ref") == pl.col("ref_right"))
+        .then(pl.col("ref").str.extract(RGX_CHR.pattern))
+        .otherwise(pl.col("contig").str.extract(RGX_CHR.pattern))
+    )
+    # Only use orientation if both agree. Otherwise, replace with best same chr ort.
+    reorient = (
+        pl.when(pl.col("ref") == pl.col("ref_right"))
+        .then(pl.col("ort"))
+        .otherwise(None)
+        .fill_null(pl.col("ort_same_chr"))
+    )
+    return (
         df_partial_contig_res.join(
-            df_jaccard_index_res.join(df_edit_distance_res, on="contig")
-            .group_by("contig")
-            .first(),
+            df_jaccard_index_res.join(df_edit_distance_res, on="contig"),
             on="contig",
             how="left",
         )
         # Add default ort per contig.
         .join(df_edit_distance_same_chr_res, on="contig", how="left")
-        .with_columns(ctg_chr=pl.col("contig").str.extract(RGX_CHR.pattern))
-    )
-
-    return (
-        df_joined.select(
+        .select(
             contig=pl.col("contig"),
-            # Extract chromosome name.
-            # Both results must concur.
-            final_contig=pl.when(pl.col("ref") == pl.col("ref_right"))
-            .then(pl.col("ref").str.extract(RGX_CHR.pattern))
-            .otherwise(pl.col("contig").str.extract(RGX_CHR.pattern)),
-            # Only use orientation if both agree. Otherwise, replace with best same chr ort.
-            reorient=pl.when(pl.col("ref") == pl.col("ref_right"))
-            .then(pl.col("ort"))
-            .otherwise(None)
-            .fill_null(pl.col("ort_same_chr")),
-            partial=pl.col("partial"),
-        )
-        # Replace chr name in original contig.
-        .with_columns(
-            final_contig=pl.col("contig").str.replace(
-                RGX_CHR.pattern, pl.col("final_contig")
-            ),
+            # Replace chr name in original contig.
+            final_contig=pl.col("contig").str.replace(RGX_CHR.pattern, final_chr),
             # Never reorient if reference.
             reorient=pl.when(pl.col("contig").str.starts_with(reference_prefix))
-            .then(
-                pl.col("reorient").str.replace(Orientation.Reverse, Orientation.Forward)
-            )
-            .otherwise(pl.col("reorient")),
+            .then(reorient.str.replace(Orientation.Reverse, Orientation.Forward))
+            .otherwise(reorient),
+            partial=pl.col("partial"),
         )
         # Take only first row per contig.
-        .group_by("contig", maintain_order=True)
-        .first()
+        .unique(subset=["contig"], keep="first", maintain_order=True)
+    )
+
+
+class ContigStatusParams(NamedTuple):
+    ref_grps: dict[str, RefCenContigs]
+    ref_types_encoded: dict[str, str]
+    ref_types_bitmask: dict[str, int]
+    rtype_encoding: dict[str, str]
+    edge_len: int
+    edge_perc_alr_thr: float
+    max_alr_len_thr: int
+    restrict_13_21: bool
+    restrict_14_22: bool
+    # Candidate references per chromosome. None if comparing against all references.
+    ref_names_by_chr: dict[str, list[str]] | None
+    min_jaccard_index: float
+    edit_dst_workers: int
+
+
+class ContigStatusResult(NamedTuple):
+    contig: str
+    partial: bool
+    refs: list[str]
+    jindex: list[float]
+    # Edit distances of forward and reverse contig. Shape of (2, len(refs)).
+    dsts: np.ndarray
+
+
+# Shared parameters of the current process. Set once per worker by _init_contig_worker.
+_CONTIG_STATUS_PARAMS: ContigStatusParams | None = None
+# Edit distances by encoded contig repeat types, contig chromosome, and compared references.
+# Identical contigs, ex. in haplotype-redundant inputs, are only aligned once.
+_EDIT_DST_CACHE: dict[tuple[str, str, tuple[str, ...]], np.ndarray] = {}
+
+
+def _init_contig_worker(params: ContigStatusParams) -> None:
+    global _CONTIG_STATUS_PARAMS
+    _CONTIG_STATUS_PARAMS = params
+    _EDIT_DST_CACHE.clear()
+
+
+def _process_contig(
+    ctg_name: str, chr_name: str, df_ctg_grp: pl.DataFrame
+) -> ContigStatusResult:
+    params = _CONTIG_STATUS_PARAMS
+    assert params is not None, "Contig worker not initialized."
+
+    logger.info(f"Evaluating {ctg_name} with {df_ctg_grp.shape[0]} repeats.")
+
+    # Check if partial ctg.
+    is_partial = is_partial_centromere(
+        df_ctg_grp,
+        edge_len=params.edge_len,
+        edge_perc_alr_thr=params.edge_perc_alr_thr,
+        max_alr_len_thr=params.max_alr_len_thr,
     )
 
+    # For acros (13, 14, 15, 21, 21)
+    # Adjust metrics to only use q-arm of chr.
+    if chr_name in ACROCENTRIC_CHROMOSOMES:
+        df_ctg_grp = get_q_arm_acro_chr(df_ctg_grp)
+
+    # Encode contig repeat types once in both orientations for all references.
+    ctg_types = encode_repeat_types(df_ctg_grp["type"], params.rtype_encoding)
+    ctg_types_rev = ctg_types[::-1]
+    ctg_types_bitmask = repeat_type_bitmask(ctg_types)
+
+    ref_names: Iterable[str]
+    if params.ref_names_by_chr is None:
+        ref_names = params.ref_grps.keys()
+    else:
+        ref_names = params.ref_names_by_chr.get(chr_name, [])
+
+    jrefs, jindex = [], []
+    for ref_name in ref_names:
+        ref_ctg = params.ref_grps[ref_name]
+        # Special case for 13 and 21 and 14 and 22.
+        if (
+            (chr_name in CHROMOSOMES_13_21 and ref_ctg.chr not in CHROMOSOMES_13_21)
+            and params.restrict_13_21
+        ) or (
+            (chr_name in CHROMOSOMES_14_22 and ref_ctg.chr not in CHROMOSOMES_14_22)
+            and params.restrict_14_22
+        ):
+            continue
+
+        repeat_type_jindex = jaccard_index(
+            params.ref_types_bitmask[ref_name], ctg_types_bitmask
+        )
+        # Skip edit distance to references sharing too few repeat types.
+        # Always keep same chr references as they determine the default ort.
+        if repeat_type_jindex < params.min_jaccard_index and ref_ctg.chr != chr_name:
+            continue
+
+        jrefs.append(ref_name)
+        jindex.append(repeat_type_jindex)
+
+    if not jrefs:
+        logger.warning(
+            f"No reference to compare {ctg_name} against. Contig will not be reoriented or renamed."
+        )
+        return ContigStatusResult(
+            ctg_name, is_partial, jrefs, jindex, np.empty((2, 0), dtype=np.int32)
+        )
+
+    # Only the lowest edit distance overall and the lowest to a same chr reference determine the result.
+    # Calculate the distances to same chr references and the reference with the most similar repeat types first.
+    best_jref = jrefs[jindex.index(max(jindex))]
+    is_exact_ref = [
+        ref_name == best_jref or f"{chr_name}:" in ref_name for ref_name in jrefs
+    ]
+    jrefs_order = sorted(range(len(jrefs)), key=lambda i: not is_exact_ref[i])
+    jrefs = [jrefs[i] for i in jrefs_order]
+    jindex = [jindex[i] for i in jrefs_order]
+    num_exact_refs = sum(is_exact_ref)
+
+    cache_key = (chr_name, tuple(jrefs))
+    if (ctg_types, *cache_key) in _EDIT_DST_CACHE:
+        ctg_dsts = _EDIT_DST_CACHE[(ctg_types, *cache_key)]
+    elif (ctg_types_rev, *cache_key) in _EDIT_DST_CACHE:
+        # Same contig in the opposite orientation.
+        ctg_dsts = _EDIT_DST_CACHE[(ctg_types_rev, *cache_key)][::-1]
+    else:
+        # Exact edit distance of contig in both orientations against same chr and most similar references.
+        ctg_dsts = cdist(
+            [ctg_types, ctg_types_rev],
+            [params.ref_types_encoded[ref_name] for ref_name in jrefs[:num_exact_refs]],
+            scorer=Levenshtein.distance,
+            dtype=np.int32,
+            workers=params.edit_dst_workers,
+        )
+        if num_exact_refs < len(jrefs):
+            # Any distance greater than both minimums can't be chosen so stop aligning once exceeded.
+            # Distances past the cutoff are returned as cutoff + 1.
+            is_same_chr_ref = [
+                f"{chr_name}:" in ref_name for ref_name in jrefs[:num_exact_refs]
+            ]
+            dst_cutoff = ctg_dsts.min()
+            if any(is_same_chr_ref):
+                dst_cutoff = max(dst_cutoff, ctg_dsts[:, is_same_chr_ref].min())
+            ctg_dsts = np.hstack(
+                [
+                    ctg_dsts,
+                    cdist(
+                        [ctg_types, ctg_types_rev],
+                        [
+                            params.ref_types_encoded[ref_name]
+                            for ref_name in jrefs[num_exact_refs:]
+                        ],
+                        scorer=Levenshtein.distance,
+                        score_cutoff=int(dst_cutoff),
+                        dtype=np.int32,
+                        workers=params.edit_dst_workers,
+                    ),
+                ]
+            )
+        _EDIT_DST_CACHE[(ctg_types, *cache_key)] = ctg_dsts
+
+    return ContigStatusResult(ctg_name, is_partial, jrefs, jindex, ctg_dsts)
+
 
 def check_cens_status(
     input_rm: str,
@@ -97,83 +258,105 @@ def check_cens_status(
     max_alr_len_thr: int = MAX_ALR_LEN_THR,
     restrict_13_21: bool = False,
     restrict_14_22: bool = False,
+    restrict_by_chr: bool = False,
+    min_jaccard_index: float = 0.0,
+    processes: int = 1,
 ) -> int:
-    df_ctg = read_repeatmasker_output(input_rm).collect()
-    df_ref = (
-        read_repeatmasker_output(reference_rm)
-        .filter(pl.col("contig").str.starts_with(reference_prefix))
-        .collect()
+    # Read both inputs in parallel.
+    df_ctg, df_ref = pl.collect_all(
+        [
+            # Extract chromosome name and only keep contigs with one.
+            read_repeatmasker_output(input_rm)
+            .with_columns(chr_name=pl.col("contig").str.extract(RGX_CHR.pattern))
+            .filter(pl.col("chr_name").is_not_null()),
+            read_repeatmasker_output(reference_rm).filter(
+                pl.col("contig").str.starts_with(reference_prefix)
+            ),
+        ]
     )
 
-    contigs, refs, dsts, orts = [], [], [], []
-    jcontigs, jrefs, jindex = [], [], []
-    pcontigs, pstatus = [], []
-
     # Split ref dataframe by chromosome.
     df_ref_grps = dict(split_ref_rm_input_by_contig(df_ref))
     logger.info(f"Read {len(df_ref_grps)} reference dataframes.")
 
-    for ctg, df_ctg_grp in df_ctg.group_by(["contig"]):
-        ctg_name = ctg[0]
-        logger.info(f"Evaluating {ctg_name} with {df_ctg_grp.shape[0]} repeats.")
+    # Encode repeat types as characters to compare repeat sequences as strings.
+    rtype_encoding = build_repeat_type_encoding(df_ctg["type"], df_ref["type"])
 
-        mtch_chr_name = re.search(RGX_CHR, ctg_name)
-        if not mtch_chr_name:
-            continue
-        chr_name = mtch_chr_name.group()
-
-        # Check if partial ctg.
-        pcontigs.append(ctg_name)
-        is_partial = is_partial_centromere(
-            df_ctg_grp,
-            edge_len=edge_len,
-            edge_perc_alr_thr=edge_perc_alr_thr,
-            max_alr_len_thr=max_alr_len_thr,
-        )
-        pstatus.append(is_partial)
+    ref_names_by_chr = None
+    if restrict_by_chr:
+        ref_names_by_chr = defaultdict(list)
+        for ref_name, ref_ctg in df_ref_grps.items():
+            # Acrocentric contigs are compared against all acrocentric references.
+            if ref_ctg.chr in ACROCENTRIC_CHROMOSOMES:
+                ref_chrs = sorted(ACROCENTRIC_CHROMOSOMES)
+            else:
+                ref_chrs = [ref_ctg.chr]
+            for ref_chr in ref_chrs:
+                ref_names_by_chr[ref_chr].append(ref_name)
 
-        # For acros (13, 14, 15, 21, 21)
-        # Adjust metrics to only use q-arm of chr.
-        if chr_name in ACROCENTRIC_CHROMOSOMES:
-            df_ctg_grp = get_q_arm_acro_chr(df_ctg_grp)
+    ref_types_encoded = {
+        ref_name: encode_repeat_types(ref_ctg.df["type"], rtype_encoding)
+        for ref_name, ref_ctg in df_ref_grps.items()
+    }
+    params = ContigStatusParams(
+        ref_grps=df_ref_grps,
+        ref_types_encoded=ref_types_encoded,
+        # Repeat types present per reference for the Jaccard index.
+        ref_types_bitmask={
+            ref_name: repeat_type_bitmask(ref_types)
+            for ref_name, ref_types in ref_types_encoded.items()
+        },
+        rtype_encoding=rtype_encoding,
+        edge_len=edge_len,
+        edge_perc_alr_thr=edge_perc_alr_thr,
+        max_alr_len_thr=max_alr_len_thr,
+        restrict_13_21=restrict_13_21,
+        restrict_14_22=restrict_14_22,
+        ref_names_by_chr=ref_names_by_chr,
+        min_jaccard_index=min_jaccard_index,
+        # Avoid oversubscribing cores if contigs are already split across processes.
+        edit_dst_workers=-1 if processes <= 1 else 1,
+    )
 
-        for ref_name, ref_ctg in df_ref_grps.items():
-            df_ref_grp = ref_ctg.df
-
-            # Special case for 13 and 21 and 14 and 22.
-            if (
-                (chr_name in CHROMOSOMES_13_21 and ref_ctg.chr not in CHROMOSOMES_13_21)
-                and restrict_13_21
-            ) or (
-                (chr_name in CHROMOSOMES_14_22 and ref_ctg.chr not in CHROMOSOMES_14_22)
-                and restrict_14_22
-            ):
-                continue
-
-            dst_fwd = editdistance.eval(
-                df_ref_grp["type"].to_list(),
-                df_ctg_grp["type"].to_list(),
-            )
-            dst_rev = editdistance.eval(
-                df_ref_grp["type"].to_list(),
-                df_ctg_grp["type"].reverse().to_list(),
-            )
+    ctg_grps = [
+        (ctg_name, chr_name, df_ctg_grp)
+        for (ctg_name, chr_name), df_ctg_grp in df_ctg.partition_by(
+            ["contig", "chr_name"], as_dict=True
+        ).items()
+    ]
 
-            repeat_type_jindex = jaccard_index(
-                set(df_ref_grp["type"]), set(df_ctg_grp["type"])
-            )
-            jcontigs.append(ctg_name)
-            jrefs.append(ref_name)
-            jindex.append(repeat_type_jindex)
-
-            contigs.append(ctg_name)
-            contigs.append(ctg_name)
-            refs.append(ref_name)
-            refs.append(ref_name)
-            orts.append(Orientation.Forward)
-            orts.append(Orientation.Reverse)
-            dsts.append(dst_fwd)
-            dsts.append(dst_rev)
+    if processes <= 1 or not ctg_grps:
+        _init_contig_worker(params)
+        ctg_results = [_process_contig(*ctg_grp) for ctg_grp in ctg_grps]
+    else:
+        # Spawn workers as polars is not fork-safe.
+        with ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_contig_worker,
+            initargs=(params,),
+        ) as pool:
+            ctg_results = list(pool.map(_process_contig, *zip(*ctg_grps)))
+
+    # Number of (contig, ref) pairs is known so preallocate result arrays.
+    num_pairs = sum(len(ctg_res.refs) for ctg_res in ctg_results)
+    pcontigs, pstatus = [], []
+    jcontigs, jrefs = [], []
+    jindex = np.empty(num_pairs, dtype=np.float64)
+    dsts = np.empty((2, num_pairs), dtype=np.int32)
+    k = 0
+    for ctg_res in ctg_results:
+        num_refs = len(ctg_res.refs)
+        pcontigs.append(ctg_res.contig)
+        pstatus.append(ctg_res.partial)
+        jcontigs.extend([ctg_res.contig] * num_refs)
+        jrefs.extend(ctg_res.refs)
+        jindex[k : k + num_refs] = ctg_res.jindex
+        dsts[:, k : k + num_refs] = ctg_res.dsts
+        k += num_refs
+
+    # Forward edit distances followed by reverse edit distances.
+    orts = np.repeat(np.array([Orientation.Forward, Orientation.Reverse]), num_pairs)
 
     df_jaccard_index_res = get_contig_similarity_by_jaccard_index(
         jcontigs, jrefs, jindex
@@ -182,9 +365,12 @@ def check_cens_status(
         df_filter_edit_distance_res,
         df_filter_ort_same_chr_res,
     ) = get_contig_similarity_by_edit_dst(
-        contigs, refs, dsts, orts, dst_perc_thr=dst_perc_thr
+        jcontigs * 2, jrefs * 2, dsts.ravel(), orts, dst_perc_thr=dst_perc_thr
+    )
+    df_partial_contig_res = pl.LazyFrame(
+        {"contig": pcontigs, "partial": pstatus},
+        schema={"contig": pl.String, "partial": pl.Boolean},
     )
-    df_partial_contig_res = pl.DataFrame({"contig": pcontigs, "partial": pstatus})
 
     res = join_summarize_results(
         df_partial_contig_res=df_partial_contig_res,
@@ -194,7 +380,7 @@ def check_cens_status(
         reference_prefix=reference_prefix,
     )
 
-    res.write_csv(output, include_header=False, separator="\t")
+    res.collect().write_csv(output, include_header=False, separator="\t")
     logger.info("Finished checking centromeres.")
 
     return 0
@@ -263,5 +449,23 @@ def add_status_cli(parser: SubArgumentParser) -> None:
         action="store_true",
         help="Restrict mapping to chromosomes 14 and 22 for chr14 and chr22 contigs.",
     )
+    ap.add_argument(
+        "--restrict_by_chr",
+        action="store_true",
+        help="Restrict mapping to the reference of the contig's chromosome. Acrocentric contigs are still mapped to all acrocentric references. Faster but misassigned non-acrocentric contigs won't be detected and contigs of chromosomes without a reference won't be reoriented.",
+    )
+    ap.add_argument(
+        "--min_jaccard_index",
+        default=0.0,
+        type=float,
+        help="Minimum repeat type Jaccard index (0-100) needed to calculate the edit distance to a reference. References of the contig's chromosome are always compared.",
+    )
+    ap.add_argument(
+        "-p",
+        "--processes",
+        default=1,
+        type=int,
+        help="Number of processes to evaluate contigs with. If 1, contigs are evaluated one at a time but edit distances are calculated with all available cores.",
+    )
 
     return None
@@ -30,26 +30,20 @@ def is_partial_centromere(
     """
     # Check if partial centromere based on ALR perc on ends.
     # Check N kbp from start and end of contig.
-    ledge = df.filter(pl.col("start") < edge_len)
-    redge = df.filter(pl.col("start") > df[-1]["end"] - edge_len)
-    try:
-        ledge_perc_alr = (
-            ledge.group_by("type")
-            .agg(pl.col("dst").sum() / ledge["dst"].sum())
-            .filter(pl.col("type") == "ALR/Alpha")
-            .row(0)[1]
-        )
-    except pl.exceptions.OutOfBoundsError:
-        ledge_perc_alr = 0.0 if not ledge.is_empty() else 100.0
-    try:
-        redge_perc_alr = (
-            redge.group_by("type")
-            .agg(pl.col("dst").sum() / redge["dst"].sum())
-            .filter(pl.col("type") == "ALR/Alpha")
-            .row(0)[1]
-        )
-    except pl.exceptions.OutOfBoundsError:
-        redge_perc_alr = 0.0 if not redge.is_empty() else 100.0
+    is_ledge = pl.col("start") < edge_len
+    is_redge = pl.col("start") > df["end"][-1] - edge_len
+    is_alr = pl.col("type") == "ALR/Alpha"
+    ledge_alr_len, ledge_len, redge_alr_len, redge_len, max_alr_len = df.select(
+        ledge_alr_len=pl.col("dst").filter(is_ledge & is_alr).sum(),
+        ledge_len=pl.col("dst").filter(is_ledge).sum(),
+        redge_alr_len=pl.col("dst").filter(is_redge & is_alr).sum(),
+        redge_len=pl.col("dst").filter(is_redge).sum(),
+        # Default to 0 if contig has no ALR.
+        max_alr_len=pl.col("dst").filter(is_alr).max().fill_null(0),
+    ).row(0)
+    # Default to 100% if no repeats on edge.
+    ledge_perc_alr = ledge_alr_len / ledge_len if ledge_len else 100.0
+    redge_perc_alr = redge_alr_len / redge_len if redge_len else 100.0
 
     # Check if edges have ALR.
     are_edges_alr = (
@@ -57,7 +51,6 @@ def is_partial_centromere(
     )
     # If they don't, check that the contig has at least one ALR that meets the minimum threshold len.
     if not are_edges_alr:
-        max_alr_len = df.filter(pl.col("type") == "ALR/Alpha").get_column("dst").max()
         return max_alr_len < max_alr_len_thr
 
     return are_edges_alr
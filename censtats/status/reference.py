@@ -1,4 +1,3 @@
-import re
 import polars as pl
 from typing import NamedTuple, Generator
 from .acrocentrics import get_q_arm_acro_chr
@@ -14,17 +13,15 @@ class RefCenContigs(NamedTuple):
 def split_ref_rm_input_by_contig(
     df_ref: pl.DataFrame,
 ) -> Generator[tuple[str, RefCenContigs], None, None]:
-    for ref, df_ref_grp in df_ref.group_by(["contig"]):
-        ref = ref[0]
-        mtch_ref_chr_name = re.search(RGX_CHR, ref)
-        if not mtch_ref_chr_name:
-            continue
-
-        ref_chr_name = mtch_ref_chr_name.group()
+    df_ref = df_ref.with_columns(
+        chr_name=pl.col("contig").str.extract(RGX_CHR.pattern)
+    ).filter(pl.col("chr_name").is_not_null())
 
+    for (ref, ref_chr_name), df_ref_grp in df_ref.partition_by(
+        ["contig", "chr_name"], as_dict=True
+    ).items():
         # Also adjust for reference acrocentrics.
         if ref_chr_name in ACROCENTRIC_CHROMOSOMES:
-            df_ref_qarm_grp = get_q_arm_acro_chr(df_ref_grp)
-            yield ref, RefCenContigs(ref_chr_name, ref, df_ref_qarm_grp)
-        else:
-            yield ref, RefCenContigs(ref_chr_name, ref, df_ref_grp)
+            df_ref_grp = get_q_arm_acro_chr(df_ref_grp)
+
+        yield ref, RefCenContigs(ref_chr_name, ref, df_ref_grp)
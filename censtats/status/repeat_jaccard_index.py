@@ -1,25 +1,37 @@
+import numpy as np
 import polars as pl
 
 
-def jaccard_index(a: set[str], b: set[str]) -> float:
+def repeat_type_bitmask(rtypes_encoded: str) -> int:
     """
-    Jaccard similarity index.
+    Bitmask of the repeat types in an encoded repeat sequence.
+    * Each repeat type sets the bit at its encoded character's codepoint.
+    """
+    bitmask = 0
+    for rtype in set(rtypes_encoded):
+        bitmask |= 1 << ord(rtype)
+    return bitmask
+
+
+def jaccard_index(a: int, b: int) -> float:
+    """
+    Jaccard similarity index of two repeat type bitmasks.
     * https://www.statisticshowto.com/jaccard-index/
     """
-    return (len(a.intersection(b)) / len(a.union(b))) * 100.0
+    return ((a & b).bit_count() / (a | b).bit_count()) * 100.0
 
 
 def get_contig_similarity_by_jaccard_index(
-    contigs: list[str], ref_contigs: list[str], jaccard_index: list[float]
-) -> pl.DataFrame:
+    contigs: list[str], ref_contigs: list[str], jaccard_index: np.ndarray
+) -> pl.LazyFrame:
     return (
         pl.LazyFrame(
-            {"contig": contigs, "ref": ref_contigs, "similarity": jaccard_index}
+            {"contig": contigs, "ref": ref_contigs, "similarity": jaccard_index},
+            schema={"contig": pl.String, "ref": pl.String, "similarity": pl.Float64},
         )
         .with_columns(
             pl.col("similarity").max().over("contig").alias("highest_similarity")
         )
         .filter(pl.col("similarity") == pl.col("highest_similarity"))
         .select(["contig", "ref", "similarity"])
-        .collect()
     )
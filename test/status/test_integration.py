@@ -35,6 +35,11 @@ from test.helpers.integration import run_integration_test
             "test/status/expected/correct_chr21_cens_false_neg_mismap.tsv",
             tuple(["--restrict_13_21"]),
         ),
+        (
+            "test/status/input/chr21_cens.fa.out",
+            "test/status/expected/correct_chr21_cens.tsv",
+            ("-p", "2"),
+        ),
     ],
 )
 def test_check_cens_status(
@@ -52,3 +57,73 @@ def test_check_cens_status(
         *additional_args,
         expected_output=expected_rc_list,
     )
+
+
+@pytest.mark.parametrize(
+    ["input_rm_out", "expected_rc_list", "additional_args", "reference_rm_out"],
+    [
+        (
+            "test/status/input/synthetic_cens.fa.out",
+            "test/status/expected/correct_synthetic_cens.tsv",
+            (),
+            "test/status/input/synthetic_ref.fa.out",
+        ),
+        (
+            "test/status/input/synthetic_cens.fa.out",
+            "test/status/expected/correct_synthetic_cens_restrict_by_chr.tsv",
+            tuple(["--restrict_by_chr"]),
+            "test/status/input/synthetic_ref.fa.out",
+        ),
+        (
+            "test/status/input/synthetic_cens.fa.out",
+            "test/status/expected/correct_synthetic_cens_min_jaccard_index.tsv",
+            ("--min_jaccard_index", "100"),
+            "test/status/input/synthetic_ref.fa.out",
+        ),
+        # No reference for chrY so no contig is compared.
+        (
+            "test/status/input/synthetic_chrY_cens.fa.out",
+            "test/status/expected/correct_synthetic_chrY_cens_no_ref.tsv",
+            tuple(["--restrict_by_chr"]),
+            "test/status/input/synthetic_ref.fa.out",
+        ),
+        (
+            "test/status/input/synthetic_chrY_cens.fa.out",
+            "test/status/expected/correct_synthetic_chrY_cens_no_ref.tsv",
+            ("--min_jaccard_index", "100"),
+            "test/status/input/synthetic_ref.fa.out",
+        ),
+        # Acrocentrics with a misnamed contig.
+        (
+            "test/status/input/synthetic_acro_cens.fa.out",
+            "test/status/expected/correct_synthetic_acro_cens.tsv",
+            (),
+            "test/status/input/synthetic_acro_ref.fa.out",
+        ),
+        # No ALR/Alpha so always partial.
+        (
+            "test/status/input/synthetic_no_alr_cens.fa.out",
+            "test/status/expected/correct_synthetic_no_alr_cens.tsv",
+            (),
+            "test/status/input/synthetic_ref.fa.out",
+        ),
+    ],
+)
+def test_check_synthetic_cens_status(
+    input_rm_out: str,
+    expected_rc_list: str,
+    additional_args: tuple[str],
+    reference_rm_out: str,
+):
+    run_integration_test(
+        "python",
+        "-m",
+        "censtats.main",
+        "status",
+        "-i",
+        input_rm_out,
+        "-r",
+        reference_rm_out,
+        *additional_args,
+        expected_output=expected_rc_list,
+    )